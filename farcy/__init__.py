@@ -2,7 +2,8 @@
 
 Usage: farcy.py [-D | --logging=LEVEL] [--comments-per-pr=LIMIT]
                 [--exclude-path=PATTERN...]
-                [--limit-user=USER...] [options] [REPOSITORY]
+                [--limit-user=USER...] [--webhook-port=PORT] [options]
+                [REPOSITORY]
 
 Options:
 
@@ -22,6 +23,11 @@ Options:
                                       list of users.
   -C LIMIT, --comments-per-pr=LIMIT   Maximum number of comments added by
                                       Farcy per pull request.
+  -w PORT, --webhook-port=PORT        Receive events from GitHub webhooks
+                                      delivered to /webhook on PORT rather
+                                      than polling for them. Requires a
+                                      secret, FARCY_WEBHOOK_SECRET or
+                                      webhook_secret, to verify deliveries.
 
 * Available log levels:
     https://docs.python.org/3/library/logging.html#logging-levels
@@ -29,26 +35,26 @@ Options:
 """
 
 from __future__ import print_function
-from collections import Counter, defaultdict
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from docopt import docopt
-from fnmatch import fnmatch
-from github3.exceptions import (
-    ConnectionError, ServerError, UnprocessableEntity
-)
+from functools import lru_cache
+from io import BytesIO
 from random import choice
-from shutil import rmtree
-from tempfile import mkdtemp
 from timeit import default_timer
 import logging
 import os
+import queue
 import sys
+import threading
 import time
-from .const import (__version__, APPROVAL_PHRASES, FARCY_COMMENT_START,
-                    STATUS_CONTEXT)
+from .const import (__version__, APPROVAL_PHRASES, CONFIG_DIR,
+                    FARCY_COMMENT_START, STATUS_CONTEXT)
 from .exceptions import FarcyException, HandlerException
-from .helpers import added_lines, plural
-from .objects import Config, ErrorTracker, UTC
+from .helpers import added_lines, load_json, plural, save_json
+from .objects import (Config, ErrorTracker, IssueCache, UTC, WebhookServer,
+                      Workspace)
 
 
 def no_handler_debug_factory(duration=3600):
@@ -59,14 +65,47 @@ def no_handler_debug_factory(duration=3600):
         now = default_timer()
         if now - last_logged.get(ext, 0) > duration:
             obj.log.debug('No handlers for extension {0}'.format(ext))
-        last_logged[ext] = now
+            last_logged[ext] = now
     return log
 
 
 class Farcy(object):
     """A bot to automate some code-review processes on GitHub pull requests."""
 
+    CACHE_DIR = os.path.join(CONFIG_DIR, 'cache')
+    CHUNK_SIZE = 65536  # The number of bytes to download at a time.
     EVENTS = {'PullRequestEvent', 'PushEvent'}
+    MAX_BACKOFF = 4  # Double the poll interval at most this many times.
+    MAX_SLEEP = 900  # Never wait longer than this between polls.
+    WEBHOOK_EVENTS = {'pull_request': 'PullRequestEvent', 'push': 'PushEvent'}
+
+    @staticmethod
+    def _conditional_listing(method, etag, **kwargs):
+        """Return the items of a listing and the ETag to cache them under.
+
+        The items are None when the listing has not changed since etag, in
+        which case the request does not count against the rate limit. The
+        returned ETag is None when the items cannot be cached, as only a single
+        page listing can be validated by its ETag.
+
+        """
+        itr = method(etag=etag, **kwargs)
+        items = list(itr)
+        if itr.last_status == 304:
+            return None, etag
+        if itr.etag and 'prev' not in itr.last_response.links:
+            return items, itr.etag
+        return items, None
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _ext_of(filename):
+        """Return the extension of filename.
+
+        Memoized as the same files are seen on every push to a pull request.
+
+        """
+        return os.path.splitext(filename)[1]
 
     def __init__(self, config):
         """Initialize an instance of Farcy that monitors owner/repository."""
@@ -82,14 +121,27 @@ class Farcy(object):
         self.log.addHandler(handler)
         self.log.info('Logging enabled at level {0}'.format(config.log_level))
 
+        state_path = self._cache_path('state')
+        state = load_json(state_path) if state_path else {}
         if config.start_event:
             self.start_time = None
             self.last_event_id = int(config.start_event) - 1
+        elif state.get('last_event_id'):
+            # Resume after the last event handled before a restart.
+            self.start_time = None
+            self.last_event_id = state['last_event_id']
+            self.log.info('Resuming after event {0}'
+                          .format(self.last_event_id))
         else:
             self.start_time = datetime.now(UTC())
             self.last_event_id = None
 
+        self._dispatch = {event_type: getattr(self, event_type)
+                          for event_type in self.EVENTS}
         self._load_handlers()
+        self._pr_comments = {}  # The (etag, Farcy comments) of each PR.
+        self._pr_last_sha = {}  # The most recently handled sha of each PR.
+        self.issue_cache = IssueCache(self._cache_path('issues', ext=''))
 
         # Initialize the repository to monitor
         self.repo = config.session.repository(
@@ -98,22 +150,29 @@ class Farcy(object):
             raise FarcyException('Invalid owner or repository name: {0}'
                                  .format(self.config.repository))
         # Keep track of open pull requests
-        self.open_prs = {}
-        for pr in self.repo.pull_requests(state='open'):
-            self.open_prs[pr.head.ref] = pr
+        self.open_prs = self._load_open_prs()
 
         self.running = False
 
+    def _cache_path(self, name, ext='.json'):
+        """Return the path to the repository specific cache file name."""
+        if not self.CACHE_DIR:
+            return None
+        return os.path.join(self.CACHE_DIR, '{0}_{1}{2}'.format(
+            self.config.repository.replace('/', '_'), name, ext))
+
     def _compute_pfile_stats(self, pfile, stats):
         added = None
-        if self.config.exclude_paths is not None and \
-                any(fnmatch(pfile.filename, pattern) for pattern
-                    in self.config.exclude_paths):
+        if self.config.path_excluded(pfile.filename):
             stats['blacklisted_files'] += 1
         elif pfile.status == 'removed':  # Ignore deleted files
             stats['deleted_files'] += 1
         elif pfile.patch is None:  # Ignore files without changes
             stats['unchanged_files'] += 1
+        elif self._ext_of(pfile.filename) not in self._ext_to_handler:
+            # Don't parse the patch of a file that cannot be linted.
+            self.no_handler_debug(self._ext_of(pfile.filename))
+            stats['unhandled_files'] += 1
         elif pfile.status in ('modified', 'renamed'):
             # Only report issues on the changed lines
             added = added_lines(pfile.patch)
@@ -128,22 +187,43 @@ class Farcy(object):
                               .format(pfile.status, pfile.filename))
         return added
 
+    def _download(self, pfile, fp):
+        """Write the raw contents of pfile to the file object fp.
+
+        Requesting the raw media type avoids decoding a base64 encoded JSON
+        response, and the contents are streamed so that large files are never
+        held in memory more than once.
+
+        """
+        from github3.exceptions import error_for
+
+        response = pfile._get(pfile.contents_url, headers={
+            'Accept': 'application/vnd.github.v3.raw'}, stream=True)
+        try:
+            if response.status_code != 200:
+                raise error_for(response)
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                fp.write(chunk)
+        finally:
+            response.close()
+
     def _event_loop(self, itr, events):
+        last_event_id, start_time = self.last_event_id, self.start_time
         newest_id = None
         for event in itr:
+            event_id = int(event.id)
             # Stop when we've already seen something
-            if self.last_event_id and int(event.id) <= self.last_event_id \
-               or self.start_time and event.created_at < self.start_time:
+            if last_event_id and event_id <= last_event_id \
+               or start_time and event.created_at < start_time:
                 break
 
-            self.log.debug('EVENT {eid} {time} {etype} {user}'.format(
-                eid=event.id, time=event.created_at, etype=event.type,
-                user=event.actor.login))
-            newest_id = newest_id or int(event.id)
+            self.log.debug('EVENT %s %s %s %s', event.id, event.created_at,
+                           event.type, event.actor.login)
+            newest_id = newest_id or event_id
 
-            # Add relevent events in reverse order
             if event.type in self.EVENTS:
-                events.insert(0, event)
+                events.append(event)
+        events.reverse()  # Events are listed from newest to oldest.
         return newest_id
 
     def _fail_allowed(self, pr):
@@ -153,7 +233,6 @@ class Farcy(object):
                 .format(pr.number, pr.user.login))
 
     def _fail_closed(self, pr):
-        pr.refresh()
         if pr.state == 'open':
             return None
         return ('Skipping PR#{0}: invalid state ({1})'
@@ -172,14 +251,10 @@ class Farcy(object):
             return 'failure', 'found {0}'.format(plural(issues, 'issue'))
         return 'success', 'approves! {0}!'.format(choice(APPROVAL_PHRASES))
 
-    def _handle_pr_file(self, pfile, pr, sha, data):
+    def _handle_pr_file(self, pfile, added, issues_future, pr, data):
         """Return whether or not an exception occured."""
-        added = self._compute_pfile_stats(pfile, data['stats'])
-        if added is None:
-            return False
-
         try:
-            file_issues = self.get_issues(pfile, pr)
+            file_issues = issues_future.result()
         except Exception:
             self.log.exception('Failure with get_issues for {0}'
                                .format(pfile.filename))
@@ -191,7 +266,6 @@ class Farcy(object):
             for message in messages:
                 data['errors'].track(message, pfile.filename, added[line])
 
-        exception_occurred = False
         for line, violations in data['errors'].errors(pfile.filename):
             if data['comments'] >= self.config.pr_issue_report_limit:
                 data['stats']['skipped_issues'] += 1
@@ -203,28 +277,20 @@ class Farcy(object):
                 self.log.info('PR#{0} ({1}:{2}): {3}"'.format(
                     pr.number, pfile.filename, line, violations))
             else:
-                msg = '\n'.join(
-                    [FARCY_COMMENT_START] + ['* {}'.format(violation)
-                                             for violation in violations])
-                try:
-                    pr.create_review_comment(msg, sha, pfile.filename,
-                                             line).html_url
-                except UnprocessableEntity as exc:
-                    self.log.exception('Failure with create_review_comment for'
-                                       ' {0} on line {1}'
-                                       .format(pfile.filename, line))
-                    self.log.exception(str(exc))
-                    exception_occurred = True
+                msg = FARCY_COMMENT_START + ''.join(
+                    '\n* ' + violation for violation in violations)
+                data['review'].append({'body': msg, 'path': pfile.filename,
+                                       'position': line})
 
             # `data['comments']` is misleading when in debug mode.  What
             # it really means is the number of comments that would be on
             # on the pr (existing + new) when not in debug mode.
             data['comments'] += 1
-        return exception_occurred
+        return False
 
     def _load_handlers(self):
         from . import handlers
-        self._ext_to_handler = defaultdict(list)
+        self._ext_to_handler = {}
         active = []
         for handler in (handlers.ESLint, handlers.Flake8, handlers.Pep257,
                         handlers.Rubocop, handlers.SCSSLint):
@@ -233,13 +299,121 @@ class Farcy(object):
             except HandlerException:
                 continue
             for ext in handler.EXTENSIONS:
-                self._ext_to_handler[ext].append(handler_inst)
+                self._ext_to_handler[ext] = self._ext_to_handler.get(
+                    ext, ()) + (handler_inst,)
             active.append(handler_inst.name)
         if active:
             self.log.info('Active handlers: %s', ', '.join(active))
         else:
             self.log.warning('No active handlers')
 
+    def _load_open_prs(self):
+        """Return a mapping of branch names to open pull requests.
+
+        The listing is cached along with its ETag so that when nothing has
+        changed, start-up costs a single conditional request that does not
+        count against the rate limit.
+
+        """
+        from github3.pulls import ShortPullRequest
+
+        path = self._cache_path('pull_requests')
+        cache = load_json(path) if path else {}
+        prs, etag = self._conditional_listing(
+            self.repo.pull_requests, cache.get('etag'), state='open')
+        if prs is None:
+            self.log.debug('Using cached listing of open pull requests')
+            prs = [ShortPullRequest(data, self.repo)
+                   for data in cache['pull_requests']]
+        elif path and etag:
+            save_json(path, {'etag': etag,
+                             'pull_requests': [pr.as_dict() for pr in prs]})
+        return {pr.head.ref: pr for pr in prs}
+
+    def _post_review(self, pr, sha, comments):
+        """Post comments as a single review and return if an error occured.
+
+        Should GitHub reject the review, the comments are posted one at a
+        time so that only the offending comments are lost.
+
+        """
+        from github3.exceptions import UnprocessableEntity
+
+        try:
+            pr.create_review(FARCY_COMMENT_START, commit_id=sha,
+                             event='COMMENT', comments=comments)
+            return False
+        except UnprocessableEntity as exc:
+            self.log.warning('Failure with create_review, posting {0} '
+                             'individually: {1}'
+                             .format(plural(comments, 'comment'), exc))
+
+        exception_occurred = False
+        for comment in comments:
+            try:
+                pr.create_review_comment(comment['body'], sha,
+                                         comment['path'], comment['position'])
+            except UnprocessableEntity as exc:
+                self.log.exception('Failure with create_review_comment for'
+                                   ' {0} on line {1}'
+                                   .format(comment['path'],
+                                           comment['position']))
+                self.log.exception(str(exc))
+                exception_occurred = True
+        return exception_occurred
+
+    def _process(self, handlers, *args):
+        """Return the combined issues from running handlers concurrently.
+
+        Each handler spends nearly all of its time waiting on a subprocess, so
+        a file takes as long as its slowest handler rather than all of them.
+
+        """
+        retval = {}
+        if len(handlers) == 1:
+            retval.update(handlers[0].process(*args))
+            return retval
+        with ThreadPoolExecutor(max_workers=len(handlers)) as executor:
+            for issues in executor.map(lambda handler: handler.process(*args),
+                                       handlers):
+                retval.update(issues)
+        return retval
+
+    def _process_in_workspace(self, handlers, pfile, pr, workspace):
+        """Return the combined issues from linting pfile within workspace."""
+        filepath = workspace.file_path(pfile.filename)
+        try:
+            with open(filepath, 'wb') as fp:
+                self._download(pfile, fp)
+            workspace.prepare(handlers, self.repo, pr)
+            return self._process(handlers, filepath)
+        finally:  # The workspace only needs to hold files being linted.
+            os.remove(filepath)
+
+    def _review_comments(self, pr):
+        """Return the review comments made by Farcy on the pull request.
+
+        Only Farcy's comments are retained, and they are revalidated with a
+        conditional request, thus an unchanged listing is neither fetched
+        again nor counted against the rate limit.
+
+        """
+        etag, cached = self._pr_comments.get(pr.number, (None, None))
+        comments, etag = self._conditional_listing(pr.review_comments, etag)
+        if comments is None:
+            return cached
+        comments = [comment for comment in comments
+                    if comment.body.startswith(ErrorTracker.FARCY_PREFIX)]
+        if etag:
+            self._pr_comments[pr.number] = (etag, comments)
+        return comments
+
+    def _save_state(self, event_id):
+        """Save the id of the last handled event to resume after on restart."""
+        path = self._cache_path('state')
+        if path:
+            save_json(path, {'last_event_id': event_id})
+
     def _set_status(self, sha, status, description):
         if not self.config.debug:
             self.repo.create_status(sha, status, context=STATUS_CONTEXT,
@@ -247,11 +421,14 @@ class Farcy(object):
 
     def events(self):
         """Yield repository events in order."""
+        from github3.exceptions import ConnectionError, ServerError
+
         if self.running:
             raise FarcyException('Can only enter `events` once.')
 
         etag = None
-        sleep_time = None  # This value will be overwritten.
+        idle_polls = 0  # The number of consecutive polls without changes.
+        poll_interval = sleep_time = None  # These values will be overwritten.
         self.running = True
         while self.running:
             if sleep_time:  # Only sleep before we're about to make requests.
@@ -268,64 +445,120 @@ class Farcy(object):
                 sleep_time = 1
                 continue
 
-            etag = itr.etag
-            self.last_event_id = newest_id or self.last_event_id
-
-            # Yield events from oldest to newest
-            for event in events:
-                yield event
-
-            sleep_time = int(itr.last_response.headers.get('X-Poll-Interval',
-                                                           sleep_time))
-
-    def get_issues(self, pfile, pr):
-        """Return a dictionary of issues for the file."""
-        ext = os.path.splitext(pfile.filename)[1]
+            if itr.last_status == 304:  # Nothing has changed.
+                # Back off while the repository is idle. Unchanged responses
+                # are free but still wake the bot up every interval.
+                idle_polls += 1
+            else:
+                etag = itr.etag
+                idle_polls = 0
+                self.last_event_id = newest_id or self.last_event_id
+
+                # Yield events from oldest to newest. Execution resumes after
+                # a yield only once the event has been handled, thus only then
+                # is it saved as the event to resume after.
+                for event in events:
+                    yield event
+                    self._save_state(int(event.id))
+                if newest_id:  # Skip any unhandled event types on restart.
+                    self._save_state(newest_id)
+
+            # GitHub may raise the interval at any time, thus always honor it.
+            poll_interval = int(itr.last_response.headers.get(
+                'X-Poll-Interval', poll_interval))
+            sleep_time = min(
+                poll_interval * 2 ** min(idle_polls, self.MAX_BACKOFF),
+                max(poll_interval, self.MAX_SLEEP))
+
+    def get_issues(self, pfile, pr, workspace=None):
+        """Return a dictionary of issues for the file.
+
+        :param workspace: The Workspace to lint the file in when the file
+            must be written to disk. A temporary one is used when not
+            provided.
+
+        """
+        ext = self._ext_of(pfile.filename)
         handlers = self._ext_to_handler.get(ext)
         if not handlers:  # Do nothing if there are no handlers
             self.no_handler_debug(ext)
             return {}
-        retval = {}
-
-        try:
-            tmpdir = mkdtemp()
-            path_in_repo = os.path.dirname(pfile.filename)
-            full_dir = os.path.join(tmpdir, path_in_repo)
-            os.makedirs(full_dir, exist_ok=True)
-            filepath = os.path.join(full_dir, os.path.basename(pfile.filename))
-            with open(filepath, 'wb') as fp:
-                fp.write(pfile.contents().decoded)
-            for handler in handlers:
-                handler.prepare_directory(tmpdir, self.repo, pr)
-                retval.update(handler.process(fp.name))
-        finally:
-            rmtree(tmpdir)
+        fingerprint = None
+        if pfile.sha is not None and all(handler.CACHEABLE
+                                         for handler in handlers):
+            fingerprint = '|'.join(
+                [ext] + [handler.fingerprint for handler in handlers])
+            cached = self.issue_cache.get(fingerprint, pfile.sha)
+            if cached is not None:
+                return cached
+        if all(handler.STDIN for handler in handlers):
+            # Avoid the disk entirely when every handler can read stdin.
+            buf = BytesIO()
+            self._download(pfile, buf)
+            retval = self._process(handlers, pfile.filename, buf.getvalue())
+        elif workspace is None:
+            with Workspace() as workspace:
+                retval = self._process_in_workspace(handlers, pfile, pr,
+                                                    workspace)
+        else:
+            retval = self._process_in_workspace(handlers, pfile, pr,
+                                                workspace)
 
+        if fingerprint is not None:
+            self.issue_cache.set(fingerprint, pfile.sha, retval)
         return retval
 
-    def handle_pr(self, pr, force=False):
-        """Provide code review on pull request."""
-        failure = not force and (self._fail_allowed(pr) or
-                                 self._fail_closed(pr) or
-                                 self._fail_ignore(pr))
-        if failure:
-            self.log.debug(failure)
+    def handle_pr(self, pr, force=False, refreshed=False):
+        """Provide code review on pull request.
+
+        :param refreshed: When true, pr was just fetched and thus is not
+            refreshed again.
+
+        """
+        if not force:
+            failure = self._fail_allowed(pr)
+            if not failure:
+                # A single refresh provides the current state and head sha.
+                if not refreshed:
+                    pr = pr.refresh()
+                failure = self._fail_closed(pr) or self._fail_ignore(pr)
+            if failure:
+                self.log.debug(failure)
+                return
+
+        sha = pr.head.sha
+        if not force and self._pr_last_sha.get(pr.number) == sha:
+            self.log.debug('Skipping PR#%s: %s was already handled',
+                           pr.number, sha)
             return
-
-        sha = list(pr.commits())[-1].sha
         self._set_status(sha, 'pending', 'started investigation')
         self.log.info('Handling PR#{0} by {1}'
                       .format(pr.number, pr.user.login))
 
         exception = False
-        error_tracker = ErrorTracker(pr.review_comments(),
+        error_tracker = ErrorTracker(self._review_comments(pr),
                                      self.config.comment_group_threshold)
         handle_data = {'comments': error_tracker.github_message_count,
                        'errors': error_tracker,
-                       'stats': Counter()}
-        for pfile in pr.files():
-            exception = self._handle_pr_file(
-                pfile, pr, sha, handle_data) or exception
+                       'review': [],
+                       'stats': defaultdict(int)}
+        with Workspace() as workspace, ThreadPoolExecutor(
+                max_workers=self.config.max_workers) as executor:
+            # Fetching and linting files happens concurrently, however, the
+            # results are handled serially, and in order, as that is where
+            # comments are posted.
+            pending = []
+            for pfile in pr.files():
+                added = self._compute_pfile_stats(pfile, handle_data['stats'])
+                if added is not None:
+                    pending.append((pfile, added, executor.submit(
+                        self.get_issues, pfile, pr, workspace)))
+            for pfile, added, issues_future in pending:
+                exception = self._handle_pr_file(
+                    pfile, added, issues_future, pr, handle_data) or exception
+        if handle_data['review']:  # Post every new comment in one request.
+            exception = self._post_review(
+                pr, sha, handle_data['review']) or exception
 
         handle_data['stats']['issues'] += error_tracker.new_issue_count
         handle_data['stats']['hidden'] += error_tracker.hidden_issue_count
@@ -333,13 +566,67 @@ class Farcy(object):
         # Log the statistics for the PR
         for key, count in sorted(handle_data['stats'].items()):
             if count > 0:
-                self.log.debug('PR#{0} {1:>16}: {2}'
-                               .format(pr.number, key, count))
+                self.log.debug('PR#%s %16s: %s', pr.number, key, count)
 
         state, message = self._get_state(handle_data['stats']['issues'],
                                          exception)
         self._set_status(sha, state, message)
         self.log.info('PR#{0} STATUS: {1}'.format(pr.number, message))
+        if not exception:  # Allow handling to be retried after an exception.
+            self._pr_last_sha[pr.number] = sha
+
+    def webhook_events(self):
+        """Yield repository events as GitHub delivers them via webhooks."""
+        from github3.events import Event
+
+        if self.running:
+            raise FarcyException('Can only enter `events` once.')
+        if not self.config.webhook_secret:
+            # Unverified deliveries could direct requests, which carry the
+            # bot's token, to any URL.
+            raise FarcyException('Receiving webhooks requires a webhook '
+                                 'secret')
+
+        events = queue.Queue()
+
+        def callback(name, delivery, payload):
+            event_type = self.WEBHOOK_EVENTS.get(name)
+            if event_type is None:
+                self.log.debug('Ignoring webhook %s (%s)', delivery, name)
+                return
+            repository = payload['repository']['full_name']
+            if repository.lower() != self.config.repository.lower():
+                self.log.warning('Ignoring webhook {0} for {1}'
+                                 .format(delivery, repository))
+                return
+            # Deliveries are shaped like the Events API's events so that
+            # they are handled identically.
+            event = Event({'actor': payload['sender'], 'created_at': None,
+                           'id': delivery, 'org': None, 'payload': payload,
+                           'public': False, 'repo': repository,
+                           'type': event_type}, self.repo)
+            event.created_at = datetime.now(UTC())
+            events.put(event)
+
+        server = WebhookServer(self.config.webhook_port,
+                               self.config.webhook_secret, callback)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.log.info('Receiving webhooks on port {0}'
+                      .format(self.config.webhook_port))
+
+        self.running = True
+        try:
+            while self.running:
+                try:  # Periodically wake up to notice when to stop running.
+                    event = events.get(timeout=1)
+                except queue.Empty:
+                    continue
+                yield event
+        finally:
+            server.shutdown()
+            server.server_close()
 
     no_handler_debug = no_handler_debug_factory()
 
@@ -348,10 +635,11 @@ class Farcy(object):
         pr = event.payload['pull_request']
         action = event.payload['action']
         branch = pr.head['ref']
-        self.log.debug('PullRequest #{num} {action} on branch {branch}'
-                       .format(action=action, branch=branch,
-                               num=pr.number))
+        self.log.debug('PullRequest #%s %s on branch %s', pr.number, action,
+                       branch)
         if action == 'closed':
+            self._pr_comments.pop(pr.number, None)
+            self._pr_last_sha.pop(pr.number, None)
             if branch in self.open_prs:
                 del self.open_prs[branch]
             else:
@@ -359,10 +647,15 @@ class Farcy(object):
                                  .format(branch))
             return
 
-        pr = pr.refresh()
+        # Fetch the pull request by number rather than trusting the URLs in
+        # the payload, as requests to them would carry the bot's token.
+        pr = self.repo.pull_request(pr.number)
+        if pr is None:
+            self.log.warning('Pull request for {0} not found'.format(branch))
+            return
         if action == 'opened':
             self.open_prs[branch] = pr
-            self.handle_pr(pr)
+            self.handle_pr(pr, refreshed=True)
         elif action == 'reopened':
             self.open_prs[branch] = pr
 
@@ -382,13 +675,20 @@ class Farcy(object):
             return
 
         self.log.info('Monitoring {0}'.format(self.repo.html_url))
-        for event in self.events():
+        events = self.webhook_events() if self.config.webhook_port \
+            else self.events()
+        for event in events:
+            callback = self._dispatch.get(event.type)
+            if callback is None:
+                self.log.debug('Ignoring event %s of type %s', event.id,
+                               event.type)
+                continue
             attempts = 3
             while attempts > 0:
                 if attempts < 3:  # Sleep only on subsequent attempts.
                     time.sleep(4 ** (3 - attempts))
                 try:
-                    getattr(self, event.type)(event)
+                    callback(event)
                     attempts = 0
                 except Exception as exc:
                     attempts -= 1
@@ -410,7 +710,8 @@ def main():
                     log_level=args['--logging'],
                     pr_issue_report_limit=args['--comments-per-pr'],
                     pull_requests=args['--pr'],
-                    start_event=args['--start'])
+                    start_event=args['--start'],
+                    webhook_port=args['--webhook-port'])
     if config.repository is None:
         sys.stderr.write('No repository specified\n')
         return 2
@@ -1,6 +1,5 @@
 """Constants used throughout Farcy."""
 import os
-import re
 
 __version__ = '1.3.0'
 
@@ -11,8 +10,6 @@ MD_VERSION_STR = ('[farcy v{0}](https://github.com/appfolio/farcy)'
 
 FARCY_COMMENT_START = '_{0}_'.format(MD_VERSION_STR)
 
-NUMBER_RE = re.compile(r'(\d+)')
-
 APPROVAL_PHRASES = [x.strip() for x in """
 Amazing
 Bravo
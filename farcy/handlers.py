@@ -5,6 +5,7 @@ from base64 import b64decode
 from collections import defaultdict
 from subprocess import CalledProcessError, STDOUT, check_output
 from update_checker import parse_version
+import hashlib
 import json
 import logging
 import os
@@ -28,21 +29,38 @@ class ExtHandler(object):
 
     ``BINARY`` is the name of an executable binary to look for.
     ``BINARY_VERSION`` is version of the binary expected.
+    ``CACHEABLE`` indicates that the issues found depend only on a file's
+    contents, the binary's version, and the handler's config file, and thus
+    may be cached.
+    ``STDIN`` indicates that the binary can read a file's contents from stdin,
+    which means that the contents need not be written to disk.
 
     """
 
     BINARY = None
     BINARY_VERSION = None
+    CACHEABLE = True
     EXTENSIONS = []
     OUTPUT = 'stdout'
+    STDIN = False
 
     @staticmethod
-    def execute(args, stderr=DEVNULL):
-        """Return output of argument execution ignoring status code."""
+    def _execute(args, stderr=DEVNULL, stdin=None):
+        """Return the status code and output of argument execution."""
         try:
-            return check_output(args, stderr=stderr).decode('utf-8')
+            return 0, check_output(args, stderr=stderr,
+                                   input=stdin).decode('utf-8')
         except CalledProcessError as exc:
-            return exc.output.decode('utf-8')
+            return exc.returncode, exc.output.decode('utf-8')
+
+    @classmethod
+    def execute(cls, args, stderr=DEVNULL, stdin=None):
+        """Return output of argument execution ignoring status code.
+
+        :param stdin: Bytes to provide to the process via stdin.
+
+        """
+        return cls._execute(args, stderr=stderr, stdin=stdin)[1]
 
     @classmethod
     def verify_version(cls, installed, exact=False):
@@ -65,6 +83,20 @@ class ExtHandler(object):
                 'Expected {0} {1}{2}, found {3}'
                 .format(cls.BINARY, op, cls.BINARY_VERSION, installed))
 
+    @property
+    def fingerprint(self):
+        """Return a string identifying what, besides a file, issues depend on.
+
+        That is the handler, the version of its binary, and the contents of its
+        config file.
+
+        """
+        config_hash = None
+        if self.config_file_path:
+            with open(self.config_file_path, 'rb') as fp:
+                config_hash = hashlib.sha1(fp.read()).hexdigest()
+        return '{0}:{1}:{2}'.format(self.name, self.version, config_hash)
+
     def __init__(self, on_demand=False):
         """A handler's constructor is called only once upon farcy start-up.
 
@@ -77,6 +109,7 @@ class ExtHandler(object):
         """
         self._logger = logging.getLogger(__name__)
         self.name = type(self).__name__
+        self.version = None
         try:
             self.assert_usable()
             self._plugin_ready = True
@@ -91,12 +124,21 @@ class ExtHandler(object):
             CONFIG_DIR, 'handler_{0}.conf'.format(self.name.lower()))
         self.config_file_path = path if os.path.isfile(path) else None
 
-    def _regex_parse(self, binary_args, stderr=None):
-        """Use the sublcasses RE value to parse the returned data."""
+    def _regex_parse(self, binary_args, stderr=None, stdin=None):
+        """Use the sublcasses RE value to parse the returned data.
+
+        Raise HandlerException when the binary fails without reporting any
+        issues, so that the failure is not mistaken for a clean file.
+
+        """
         retval = defaultdict(list)
-        for (lineno, msg) in self.RE.findall(self.execute(
-                [self.BINARY] + binary_args, stderr=stderr)):
+        status, output = self._execute([self.BINARY] + binary_args,
+                                       stderr=stderr, stdin=stdin)
+        for (lineno, msg) in self.RE.findall(output):
             retval[int(lineno)].append(msg)
+        if status and not retval:
+            raise HandlerException('{0} exited with status {1}: {2}'.format(
+                self.BINARY, status, output.strip()))
         return retval
 
     def assert_usable(self):
@@ -117,7 +159,8 @@ class ExtHandler(object):
                 raise HandlerException('{0} cannot be executed.'
                                        .format(self.BINARY))
             raise  # Unexpected and unhandled exception
-        self.verify_version(self.version_callback(version))
+        self.version = self.version_callback(version)
+        self.verify_version(self.version)
 
     def prepare_directory(self, temp_dir, repo, pr):
         """Perform any preprocessing before linting.
@@ -144,7 +187,7 @@ class ExtHandler(object):
         self._prepare_directory(temp_dir, repo, pr)
         return
 
-    def process(self, filename):
+    def process(self, filename, contents=None):
         """Return a dictionary mapping line numbers to errors.
 
         The value for each line number in the dictionary should be a list where
@@ -152,6 +195,8 @@ class ExtHandler(object):
         the line.
 
         :param filename: The filename to analyze.
+        :param contents: The file's contents as bytes. Handlers that support
+            ``STDIN`` analyze these contents rather than reading filename.
 
         """
         # This method should not be implemented by a subclass. Use _process
@@ -164,6 +209,8 @@ class ExtHandler(object):
                 self._logger.warning('{0} is not ready: {1}'
                                      .format(self.name, exc.message))
                 return {}
+        if contents is not None and self.STDIN:
+            return self._process_stdin(contents)
         return self._process(filename)
 
     def version_callback(self, version):
@@ -177,17 +224,17 @@ class ESLint(ExtHandler):
     BINARY = 'eslint'
     BINARY_VERSION = '1.1.0'
     EXTENSIONS = ['.js', '.jsx']
+    STDIN = True
 
-    def _prepare_directory(self, temp_dir, repo, pr):
-        return
-
-    def _process(self, filename):
+    def _command(self):
         command = [self.BINARY, '--format', 'json']
         config_path = self.config_file_path
         if config_path:
             command += ['--config', config_path]
+        return command
 
-        data = json.loads(self.execute(command + [filename]))[0]
+    def _parse(self, output):
+        data = json.loads(output)[0]
         retval = defaultdict(list)
 
         for offense in data['messages']:
@@ -197,6 +244,16 @@ class ESLint(ExtHandler):
             retval[offense['line']].append(message)
         return retval
 
+    def _prepare_directory(self, temp_dir, repo, pr):
+        return
+
+    def _process(self, filename):
+        return self._parse(self.execute(self._command() + [filename]))
+
+    def _process_stdin(self, contents):
+        return self._parse(self.execute(self._command() + ['--stdin'],
+                                        stdin=contents))
+
     def version_callback(self, version):
         """Remove the 'v' prefix and trailing space."""
         return version[1:].strip()
@@ -209,14 +266,20 @@ class Flake8(ExtHandler):
     BINARY_VERSION = '2.4.1'
     EXTENSIONS = ['.py']
     RE = re.compile(r'[^:]+:(\d+):([^\n]+)\n')
+    STDIN = True
+
+    def _command(self):
+        config_path = self.config_file_path
+        return ['--config', config_path] if config_path else []
 
     def _prepare_directory(self, temp_dir, repo, pr):
         return
 
     def _process(self, filename):
-        config_path = self.config_file_path
-        command = ['--config', config_path] if config_path else []
-        return self._regex_parse(command + [filename])
+        return self._regex_parse(self._command() + [filename])
+
+    def _process_stdin(self, contents):
+        return self._regex_parse(self._command() + ['-'], stdin=contents)
 
     def version_callback(self, version):
         """Remove the extra version information."""
@@ -266,6 +329,7 @@ class Rubocop(ExtHandler):
 
     BINARY = 'rubocop'
     BINARY_VERSION = '0.50'
+    CACHEABLE = False  # Issues depend upon the pull request's .rubocop.yml.
     EXTENSIONS = ['.rb']
 
     def _prepare_directory(self, temp_dir, repo, pr):
@@ -1,33 +1,44 @@
 """Helper methods and classes."""
 
-from github3 import GitHub
-from github3.exceptions import GitHubError
+from functools import lru_cache
+from tempfile import mkstemp
+import json
 import os
 import sys
-from .const import NUMBER_RE, CONFIG_DIR
+from .const import CONFIG_DIR
 from .exceptions import FarcyException
 
 if sys.version_info >= (3, 0):
     basestring = str
 
 
+@lru_cache(maxsize=1024)
 def added_lines(patch):
-    """Return a mapping of added line numbers to the patch line numbers."""
+    """Return a mapping of added line numbers to the patch line numbers.
+
+    Results are memoized as the same patch is parsed on every push to a pull
+    request, thus the returned mapping must not be modified.
+
+    """
     added = {}
     lineno = None
     position = 0
     for line in patch.split('\n'):
-        if line.startswith('@@'):
-            lineno = int(NUMBER_RE.match(line.split('+')[1]).group(1))
-        elif line.startswith(' '):
+        # Dispatch on the first character, most common lines first.
+        first = line[:1]
+        if first == ' ':
             lineno += 1
-        elif line.startswith('+'):
+        elif first == '+':
             added[lineno] = position
             lineno += 1
+        elif line.startswith('@@'):
+            # The new start line follows the '+' as in: @@ -1,2 +3,4 @@
+            lineno = int(line.partition('+')[2].split(' ', 1)[0]
+                         .split(',', 1)[0])
         elif line == r'\ No newline at end of file':
             continue
         else:
-            assert line.startswith('-')
+            assert first == '-'
         position += 1
     return added
 
@@ -40,6 +51,9 @@ def ensure_config_dir():
 
 def get_session():
     """Fetch and/or load API authorization token for GITHUB."""
+    from github3 import GitHub
+    from github3.exceptions import GitHubError
+
     ensure_config_dir()
     credential_file = os.path.join(CONFIG_DIR, 'github_auth')
     if os.path.isfile(credential_file):
@@ -71,6 +85,19 @@ def get_session():
     return GitHub(token=auth.token)
 
 
+def load_json(path):
+    """Return the JSON object stored at path, or an empty dict.
+
+    Missing or unreadable files are treated as empty.
+
+    """
+    try:
+        with open(path) as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
 def parse_bool(value):
     """Return whether or not value represents a True or False value."""
     if isinstance(value, basestring):
@@ -126,3 +153,19 @@ def raise_unexpected(code):
     """
     if code != 401:
         raise
+
+
+def save_json(path, data):
+    """Atomically write data as JSON to path.
+
+    The data is written to a temporary file that replaces path only once it
+    is complete, thus readers never see a partially written file.
+
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # A unique temporary file per write keeps concurrent writers apart.
+    fd, tmp_path = mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(data, fp)
+    os.rename(tmp_path, path)
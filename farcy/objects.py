@@ -5,26 +5,71 @@ try:
 except ImportError:
     from ConfigParser import SafeConfigParser as ConfigParser  # PY2
 
+from collections import OrderedDict
 from datetime import timedelta, tzinfo
+from fnmatch import translate
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from shutil import rmtree
+from tempfile import mkdtemp
+import hashlib
+import hmac
+import json
 import logging
 import os
 import re
-from .const import CONFIG_DIR, FARCY_COMMENT_START
+import threading
+from .const import __version__, CONFIG_DIR, FARCY_COMMENT_START
 from .exceptions import FarcyException
-from .helpers import get_session, parse_bool, parse_set
+from .helpers import (get_session, load_json, parse_bool, parse_set,
+                      save_json)
 
 
 class Config(object):
     """Holds configuration for Farcy."""
 
     ATTRIBUTES = {'comment_group_threshold', 'debug', 'exclude_paths',
-                  'exclude_users', 'limit_users', 'log_level',
-                  'pr_issue_report_limit', 'pull_requests', 'start_event'}
-    INT_ATTRS = {'comment_group_threshold', 'pr_issue_report_limit',
-                 'start_event'}
+                  'exclude_users', 'limit_users', 'log_level', 'max_workers',
+                  'pr_issue_report_limit', 'pull_requests', 'start_event',
+                  'webhook_port', 'webhook_secret'}
+    GLOB_CHARS = frozenset('*?[')
+    INT_ATTRS = {'comment_group_threshold', 'max_workers',
+                 'pr_issue_report_limit', 'start_event', 'webhook_port'}
     LOG_LEVELS = {'CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG', 'NOTSET'}
     PATH = os.path.join(CONFIG_DIR, 'farcy.conf')
 
+    @classmethod
+    def _exclusion_matcher(cls, patterns):
+        """Return a memoized function that tests if a path matches patterns.
+
+        Patterns such as `*.min.js` and `vendor/*` are tested with plain
+        string comparisons, while any others are matched at once with a
+        single compiled regex. As the same paths are checked on every push to
+        a pull request, the outcomes are cached.
+
+        """
+        if not patterns:
+            return lambda path: False
+        prefixes, suffixes, others = [], [], []
+        for pattern in sorted(patterns):
+            if pattern.endswith('*') and \
+                    cls.GLOB_CHARS.isdisjoint(pattern[:-1]):
+                prefixes.append(pattern[:-1])
+            elif pattern.startswith('*') and \
+                    cls.GLOB_CHARS.isdisjoint(pattern[1:]):
+                suffixes.append(pattern[1:])
+            else:
+                others.append(pattern)
+        prefixes, suffixes = tuple(prefixes), tuple(suffixes)
+        regex = re.compile('|'.join(translate(pattern) for pattern in others)
+                           if others else r'(?!)')
+
+        @lru_cache(maxsize=4096)
+        def matcher(path):
+            return path.startswith(prefixes) or path.endswith(suffixes) or \
+                bool(regex.match(path))
+        return matcher
+
     @property
     def log_level_int(self):
         """Int value of the log level."""
@@ -48,7 +93,7 @@ class Config(object):
     def __repr__(self):
         """String representation of the config."""
         keys = sorted(x for x in self.__dict__ if not x.startswith('_') and
-                      x != 'repository')
+                      x not in ('repository', 'webhook_secret'))
         arg_fmt = ', '.join(['{0}={1!r}'.format(key, getattr(self, key))
                              for key in keys])
         return 'Config({0!r}, {1})'.format(self.repository, arg_fmt)
@@ -66,6 +111,8 @@ class Config(object):
         elif attr in ('exclude_paths', 'pull_requests'):
             if value is not None:
                 value = parse_set(value)
+            if attr == 'exclude_paths':
+                self._path_excluded = self._exclusion_matcher(value)
         elif attr in ('exclude_users', 'limit_users'):
             if value:
                 value = parse_set(value, normalize=True)
@@ -110,6 +157,10 @@ class Config(object):
             if attr in self.ATTRIBUTES and value:
                 setattr(self, attr, value)
 
+    def path_excluded(self, path):
+        """Return if path matches any of the excluded path patterns."""
+        return self._path_excluded(path)
+
     def set_defaults(self):
         """Set the default config values."""
         self.comment_group_threshold = 3
@@ -118,9 +169,12 @@ class Config(object):
         self.exclude_users = None
         self.limit_users = None
         self.log_level = 'ERROR'
+        self.max_workers = 5  # The number of files to concurrently lint.
         self.pr_issue_report_limit = 128
         self.pull_requests = None
         self.start_event = None
+        self.webhook_port = None
+        self.webhook_secret = os.environ.get('FARCY_WEBHOOK_SECRET')
 
     def user_allowed(self, user):
         """Return if user is allowed."""
@@ -259,6 +313,106 @@ class ErrorTracker(object):
             error_message.track(line, is_github)
 
 
+class IssueCache(object):
+    """Persist the issues found in files across runs of Farcy.
+
+    Entries are keyed by a fingerprint of the handlers that lint a file, and
+    the file's git blob sha, so that file contents which have already been
+    linted the same way are never linted again. The cache is specific to the
+    running version of Farcy. Each entry is atomically written to its own file
+    within a directory, so concurrent processes never corrupt the cache. Once
+    the directory holds more than ``MAX_SIZE`` entries, the least recently
+    written half of them are removed.
+
+    """
+
+    MAX_SIZE = 65536  # The number of entries to hold on disk.
+    MEMORY_SIZE = 512  # The number of entries to also hold in memory.
+
+    @staticmethod
+    def _key(fingerprint, sha):
+        return '{0}:{1}:{2}'.format(__version__, fingerprint, sha)
+
+    def __init__(self, path=None):
+        """Initialize an IssueCache object.
+
+        :param path: The directory to store entries in. The directory is not
+            created until the first entry is stored. When not provided,
+            entries are only held in memory.
+
+        """
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # Least recently used entries first.
+        self._path = path
+        self._size = None  # The number of entries on disk, counted lazily.
+
+    def _entry_path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._path, '{0}.json'.format(digest))
+
+    def _evict(self):
+        """Remove the least recently written half of the entries on disk."""
+        entries = []
+        for name in os.listdir(self._path):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self._path, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:  # Removed by another process.
+                pass
+        entries.sort()
+        for _, path in entries[:len(entries) - self.MAX_SIZE // 2]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = min(len(entries), self.MAX_SIZE // 2)
+
+    def _remember(self, key, issues):
+        self._memory[key] = issues
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.MEMORY_SIZE:
+            self._memory.popitem(last=False)
+
+    def get(self, fingerprint, sha):
+        """Return the cached issues for the blob, or None when absent.
+
+        Recently used entries are served from memory without reading their
+        file.
+
+        """
+        key = self._key(fingerprint, sha)
+        with self._lock:
+            issues = self._memory.get(key)
+        if issues is None and self._path:
+            data = load_json(self._entry_path(key))
+            if 'issues' in data:
+                issues = {int(line): messages
+                          for line, messages in data['issues']}
+        if issues is not None:
+            with self._lock:
+                self._remember(key, issues)
+        return issues
+
+    def set(self, fingerprint, sha, issues):
+        """Store the issues (a line to messages mapping) for the blob."""
+        key = self._key(fingerprint, sha)
+        issues = dict(issues)
+        with self._lock:
+            self._remember(key, issues)
+        if not self._path:
+            return
+        save_json(self._entry_path(key), {'issues': sorted(issues.items())})
+        with self._lock:
+            if self._size is None:
+                self._size = len(os.listdir(self._path))
+            else:
+                self._size += 1
+            if self._size > self.MAX_SIZE:
+                self._evict()
+
+
 class UTC(tzinfo):
     """Provides a simple UTC timezone class.
 
@@ -277,3 +431,121 @@ class UTC(tzinfo):
     def utcoffset(self, dt):
         """Offset from UTC time."""
         return timedelta(0)
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """Handle a single webhook delivery made to a WebhookServer."""
+
+    PATH = '/webhook'
+
+    @staticmethod
+    def _has_required_keys(payload):
+        """Return whether the payload names its repository and sender."""
+        return isinstance(payload, dict) and \
+            isinstance(payload.get('sender'), dict) and \
+            isinstance(payload.get('repository'), dict) and \
+            isinstance(payload['repository'].get('full_name'), str)
+
+    def do_POST(self):
+        """Verify and pass along a webhook delivery."""
+        if self.path != self.PATH:
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.server.verify(body,
+                                  self.headers.get('X-Hub-Signature-256')):
+            self.send_error(403, 'Invalid signature')
+            return
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            self.send_error(400, 'Invalid JSON payload')
+            return
+        if not self._has_required_keys(payload):
+            self.send_error(400, 'Payload lacks a repository or sender')
+            return
+        self.server.callback(self.headers.get('X-GitHub-Event'),
+                             self.headers.get('X-GitHub-Delivery'), payload)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        """Log requests to Farcy's logger rather than stderr."""
+        logging.getLogger('farcy').debug('Webhook {0} {1}'.format(
+            self.address_string(), format % args))
+
+
+class WebhookServer(HTTPServer):
+    """Receive GitHub webhook deliveries and pass them to a callback.
+
+    Deliveries are made to ``/webhook``. Only deliveries carrying a valid
+    ``X-Hub-Signature-256`` header are accepted.
+
+    """
+
+    def __init__(self, port, secret, callback, address=''):
+        """Initialize a WebhookServer object.
+
+        :param port: The port to listen on.
+        :param secret: The secret shared with GitHub to sign deliveries.
+        :param callback: Called with the event name, delivery id, and decoded
+            payload of each accepted delivery.
+
+        """
+        if not secret:
+            raise FarcyException('A webhook secret is required')
+        HTTPServer.__init__(self, (address, port), WebhookRequestHandler)
+        self.callback = callback
+        self.secret = secret.encode('utf-8')
+
+    def verify(self, body, signature):
+        """Return whether or not the body's signature is valid."""
+        expected = 'sha256={0}'.format(
+            hmac.new(self.secret, body, hashlib.sha256).hexdigest())
+        return hmac.compare_digest(expected, signature or '')
+
+
+class Workspace(object):
+    """A temporary directory in which the files of a pull request are linted.
+
+    Each handler prepares the directory at most once, thus anything a handler
+    fetches to do so is fetched once per pull request rather than per file.
+
+    """
+
+    def __enter__(self):
+        """Return the workspace."""
+        return self
+
+    def __exit__(self, *args):
+        """Remove the workspace."""
+        self.close()
+
+    def __init__(self):
+        """Initialize a Workspace object by creating its directory."""
+        self._lock = threading.Lock()
+        self._prepared = set()
+        self.path = mkdtemp()
+
+    def close(self):
+        """Remove the directory and everything within it."""
+        rmtree(self.path)
+
+    def file_path(self, filename):
+        """Return the path for filename within the workspace.
+
+        Any missing parent directories are created.
+
+        """
+        full_dir = os.path.join(self.path, os.path.dirname(filename))
+        if not os.path.isdir(full_dir):
+            os.makedirs(full_dir, exist_ok=True)
+        return os.path.join(full_dir, os.path.basename(filename))
+
+    def prepare(self, handlers, repo, pr):
+        """Prepare the directory for any handlers that have not done so."""
+        with self._lock:
+            for handler in handlers:
+                if handler not in self._prepared:
+                    handler.prepare_directory(self.path, repo, pr)
+                    self._prepared.add(handler)
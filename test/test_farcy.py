@@ -4,21 +4,32 @@ from __future__ import print_function
 from collections import namedtuple
 from datetime import datetime
 from farcy import (Config, FARCY_COMMENT_START, Farcy, FarcyException, UTC,
-                   main, no_handler_debug_factory)
-from mock import MagicMock, call, patch
-from github3.exceptions import ConnectionError
+                   Workspace, main, no_handler_debug_factory)
+from farcy.helpers import load_json
+from mock import ANY, MagicMock, call, patch
+from github3.exceptions import ConnectionError, UnprocessableEntity
+from shutil import rmtree
+from tempfile import mkdtemp
 import farcy as farcy_module
 import logging
+import os
+import subprocess
+import sys
 import unittest
 from .helper import Struct
 
 Config.PATH = '/dev/null'  # Don't allow the system config file to load.
+Farcy.CACHE_DIR = None  # Don't read or write the system cache files.
 farcy_module.APPROVAL_PHRASES = ['Dummy Approval']  # Provide only one option.
 
-PFILE_ATTRS = ['contents', 'filename', 'patch', 'status']
+PFILE_ATTRS = ['contents', 'contents_url', 'filename', 'patch', 'sha',
+               'status']
 
-MockInfo = namedtuple('Info', ['decoded'])
-MockPFile = namedtuple('PFile', PFILE_ATTRS)
+
+class MockPFile(namedtuple('PFile', PFILE_ATTRS)):
+    def _get(self, url, **kwargs):
+        return Struct(close=lambda: None, status_code=200,
+                      iter_content=lambda chunk_size: [self.contents])
 
 
 def assert_calls(method, *calls):
@@ -40,6 +51,13 @@ def assert_status(farcy, failures=0):
                       description='started investigation'), call2)
 
 
+def mockpr(**kwargs):
+    kwargs.setdefault('head', Struct(sha='dummy'))
+    pr = MagicMock(**kwargs)
+    pr.refresh.return_value = pr
+    return pr
+
+
 def mockpfile(**kwargs):
     for attr in PFILE_ATTRS:
         kwargs.setdefault(attr, None)
@@ -67,8 +85,10 @@ class FarcyTest(FarcyBaseTest):
     def test_compute_pfile_stats__added(self, mock_added_lines):
         mock_added_lines.return_value = {13: 10, 15: 20, 18: 100}
         stats = {'added_files': 10, 'added_lines': 10}
-        actual = self._farcy_instance()._compute_pfile_stats(
-            mockpfile(patch='', status='added'), stats)
+        farcy = self._farcy_instance()
+        farcy._ext_to_handler = {'.py': ()}
+        actual = farcy._compute_pfile_stats(
+            mockpfile(filename='DUMMY.py', patch='', status='added'), stats)
         self.assertTrue(mock_added_lines.called)
         self.assertEqual(mock_added_lines.return_value, actual)
         self.assertEqual({'added_files': 11, 'added_lines': 13}, stats)
@@ -85,10 +105,13 @@ class FarcyTest(FarcyBaseTest):
     @patch('farcy.added_lines')
     def test_compute_pfile_stats__modified(self, mock_added_lines):
         mock_added_lines.return_value = {1: 1, 2: 2}
+        farcy = self._farcy_instance()
+        farcy._ext_to_handler = {'.py': ()}
         for status in ['modified', 'renamed']:
             stats = {'modified_files': 10, 'modified_lines': 10}
-            actual = self._farcy_instance()._compute_pfile_stats(
-                mockpfile(patch='', status=status), stats)
+            actual = farcy._compute_pfile_stats(
+                mockpfile(filename='DUMMY.py', patch='', status=status),
+                stats)
             self.assertTrue(mock_added_lines.called)
             mock_added_lines.reset_mock()
             self.assertEqual(mock_added_lines.return_value, actual)
@@ -112,16 +135,51 @@ class FarcyTest(FarcyBaseTest):
 
     def test_compute_pfile_stats__unexpected_status(self):
         stats = {}
+        farcy = self._farcy_instance()
+        farcy._ext_to_handler = {'.py': ()}
         with patch.object(self.logger, 'critical') as mock_critical:
-            self.assertEqual(None, self._farcy_instance()._compute_pfile_stats(
-                mockpfile(patch='', status='foobar'), stats))
+            self.assertEqual(None, farcy._compute_pfile_stats(
+                mockpfile(filename='DUMMY.py', patch='', status='foobar'),
+                stats))
             self.assertTrue(mock_critical.called)
         self.assertEqual({}, stats)
 
+    @patch('farcy.added_lines')
+    def test_compute_pfile_stats__unhandled(self, mock_added_lines):
+        stats = {'unhandled_files': 10}
+        farcy = self._farcy_instance()
+        farcy._ext_to_handler = {'.py': ()}
+        self.assertEqual(None, farcy._compute_pfile_stats(
+            mockpfile(filename='DUMMY.png', patch='', status='added'), stats))
+        self.assertFalse(mock_added_lines.called)
+        self.assertEqual({'unhandled_files': 11}, stats)
+
+    def test_download(self):
+        pfile = MagicMock(contents_url='https://dummy')
+        pfile._get.return_value.status_code = 200
+        pfile._get.return_value.iter_content.return_value = [b'a', b'b']
+        fp = MagicMock()
+        self._farcy_instance()._download(pfile, fp)
+        pfile._get.assert_called_once_with(
+            'https://dummy', headers={
+                'Accept': 'application/vnd.github.v3.raw'}, stream=True)
+        assert_calls(fp.write, call(b'a'), call(b'b'))
+        self.assertTrue(pfile._get.return_value.close.called)
+
+    def test_download__error(self):
+        pfile = MagicMock(contents_url='https://dummy')
+        pfile._get.return_value.status_code = 404
+        fp = MagicMock()
+        with patch('github3.exceptions.error_for',
+                   return_value=FarcyException):
+            self.assertRaises(FarcyException, self._farcy_instance()._download,
+                              pfile, fp)
+        self.assertFalse(fp.write.called)
+        self.assertTrue(pfile._get.return_value.close.called)
+
     def test_get_issues__simple_module(self):
         farcy = self._farcy_instance()
-        pfile = mockpfile(contents=lambda: MockInfo(decoded=b'"""A."""\n'),
-                          filename='a.py')
+        pfile = mockpfile(contents=b'"""A."""\n', filename='a.py')
         pr = MagicMock(number=444, state='open', user=Struct(login='Dummy'))
         self.assertEqual({}, farcy.get_issues(pfile, pr))
 
@@ -130,15 +188,94 @@ class FarcyTest(FarcyBaseTest):
                                                     mock_prepare_directory):
         farcy = self._farcy_instance()
         pfile = mockpfile(
-            contents=lambda: MockInfo(
-                decoded=b'# frozen_string_literal: true\n'
-            ),
+            contents=b'# frozen_string_literal: true\n',
             filename='app/controllers/a.rb'
         )
         pr = MagicMock(number=444, state='open', user=Struct(login='Dummy'))
         self.assertEqual({}, farcy.get_issues(pfile, pr))
         self.assertTrue(mock_prepare_directory.called)
 
+    def test_get_issues__cached(self):
+        farcy = self._farcy_instance()
+        farcy.issue_cache = MagicMock()
+        farcy.issue_cache.get.return_value = {1: ['Dummy Failure']}
+        handler = MagicMock(CACHEABLE=True, fingerprint='Dummy:1.0:None')
+        farcy._ext_to_handler = {'.py': (handler,)}
+        pfile = mockpfile(filename='a.py', sha='deadbeef')
+        self.assertEqual({1: ['Dummy Failure']}, farcy.get_issues(pfile, None))
+        farcy.issue_cache.get.assert_called_once_with('.py|Dummy:1.0:None',
+                                                      'deadbeef')
+        self.assertFalse(handler.process.called)
+        self.assertFalse(farcy.issue_cache.set.called)
+
+    def test_get_issues__cache_miss(self):
+        farcy = self._farcy_instance()
+        farcy.issue_cache = MagicMock()
+        farcy.issue_cache.get.return_value = None
+        handler = MagicMock(CACHEABLE=True, fingerprint='Dummy:1.0:None',
+                            STDIN=True)
+        handler.process.return_value = {}
+        farcy._ext_to_handler = {'.py': (handler,)}
+        pfile = mockpfile(contents=b'"""A."""\n', filename='a.py',
+                          sha='deadbeef')
+        self.assertEqual({}, farcy.get_issues(pfile, None))
+        farcy.issue_cache.set.assert_called_once_with(
+            '.py|Dummy:1.0:None', 'deadbeef', {})
+
+    def test_get_issues__not_cacheable(self):
+        farcy = self._farcy_instance()
+        farcy.issue_cache = MagicMock()
+        handler_1 = MagicMock(CACHEABLE=True, STDIN=True)
+        handler_1.process.return_value = {}
+        handler_2 = MagicMock(CACHEABLE=False, STDIN=True)
+        handler_2.process.return_value = {1: ['Dummy Failure']}
+        farcy._ext_to_handler = {'.rb': (handler_1, handler_2)}
+        pfile = mockpfile(contents=b'a\n', filename='a.rb', sha='deadbeef')
+        self.assertEqual({1: ['Dummy Failure']}, farcy.get_issues(pfile, None))
+        self.assertFalse(farcy.issue_cache.get.called)
+        self.assertFalse(farcy.issue_cache.set.called)
+
+    @patch('farcy.Workspace')
+    def test_get_issues__stdin_handlers(self, mock_workspace):
+        farcy = self._farcy_instance()
+        handler = MagicMock(STDIN=True)
+        handler.process.return_value = {1: ['Dummy Failure']}
+        farcy._ext_to_handler = {'.py': [handler]}
+        pfile = mockpfile(contents=b'"""A."""\n', filename='a.py')
+        self.assertEqual({1: ['Dummy Failure']}, farcy.get_issues(pfile, None))
+        handler.process.assert_called_once_with('a.py', b'"""A."""\n')
+        self.assertFalse(handler.prepare_directory.called)
+        self.assertFalse(mock_workspace.called)
+
+    def test_get_issues__multiple_handlers(self):
+        farcy = self._farcy_instance()
+        handler_1 = MagicMock(STDIN=True)
+        handler_1.process.return_value = {1: ['Failure 1']}
+        handler_2 = MagicMock(STDIN=False)
+        handler_2.process.return_value = {2: ['Failure 2']}
+        farcy._ext_to_handler = {'.py': [handler_1, handler_2]}
+        pfile = mockpfile(contents=b'"""A."""\n', filename='a.py')
+        self.assertEqual({1: ['Failure 1'], 2: ['Failure 2']},
+                         farcy.get_issues(pfile, None))
+        self.assertTrue(handler_1.prepare_directory.called)
+        self.assertTrue(handler_2.prepare_directory.called)
+
+    def test_get_issues__shared_workspace(self):
+        farcy = self._farcy_instance()
+        handler = MagicMock(STDIN=False)
+        handler.process.return_value = {}
+        farcy._ext_to_handler = {'.py': [handler]}
+        with Workspace() as workspace:
+            for filename in ('a.py', 'b/c.py'):
+                self.assertEqual({}, farcy.get_issues(mockpfile(
+                    contents=b'"""A."""\n', filename=filename), None,
+                    workspace))
+                self.assertFalse(os.path.exists(os.path.join(workspace.path,
+                                                             filename)))
+        handler.prepare_directory.assert_called_once_with(
+            workspace.path, farcy.repo, None)
+        self.assertFalse(os.path.exists(workspace.path))
+
     def test_get_issues__no_handlers(self):
         farcy = self._farcy_instance()
         self.assertEqual({}, farcy.get_issues(mockpfile(filename=''), None))
@@ -148,6 +285,16 @@ class FarcyHandlePrTest(FarcyBaseTest):
     DUMMY_COMMENT = Struct(body='_[farcy \n* MatchingError', path='DummyFile',
                            position=16)
 
+    def _farcy_instance(self, *args, **kwargs):
+        farcy = super(FarcyHandlePrTest, self)._farcy_instance(*args,
+                                                               **kwargs)
+        farcy._ext_to_handler = {'': ()}  # Handle the extensionless files.
+        return farcy
+
+    def _listing(self, comments, status=200, links=None):
+        return Struct(comments, etag='DUMMY_ETAG', last_status=status,
+                      last_response=Struct(links=links or {}))
+
     @patch('farcy.Farcy.get_issues')
     @patch('farcy.added_lines')
     def test_handle_pr__exception_from_get_issues(self, mock_added_lines,
@@ -158,9 +305,8 @@ class FarcyHandlePrTest(FarcyBaseTest):
         mock_added_lines.return_value = {16: 16}
         mock_get_issues.side_effect = side_effect
 
-        pr = MagicMock(number=180, state='open', user=Struct(login='Dummy'))
-        pr.commits.return_value = [Struct(sha='dummy')]
-        pfile = mockpfile(patch='', status='added')
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        pfile = mockpfile(filename='DummyFile', patch='', status='added')
         pr.files.return_value = [pfile]
 
         farcy = self._farcy_instance()
@@ -171,7 +317,7 @@ class FarcyHandlePrTest(FarcyBaseTest):
                               'handler. Check log.'))
 
         mock_added_lines.assert_called_with('')
-        mock_get_issues.assert_called_once_with(pfile, pr)
+        mock_get_issues.assert_called_once_with(pfile, pr, ANY)
         assert_calls(farcy.repo.create_status,
                      call('dummy', 'pending', context='farcy',
                           description='started investigation'),
@@ -179,8 +325,34 @@ class FarcyHandlePrTest(FarcyBaseTest):
                           description=('encountered an exception in handler. '
                                        'Check log.')))
 
+    @patch('farcy.Farcy.get_issues')
+    @patch('farcy.added_lines')
+    def test_handle_pr__multiple_files(self, mock_added_lines,
+                                       mock_get_issues):
+        mock_added_lines.return_value = {16: 16}
+        mock_get_issues.side_effect = lambda pfile, pr, workspace: {
+            16: ['{0} Failure'.format(pfile.filename)]}
+
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        pfiles = [mockpfile(filename='File{0}'.format(i), patch='',
+                            status='added') for i in range(8)]
+        pr.files.return_value = pfiles
+
+        farcy = self._farcy_instance()
+        farcy.handle_pr(pr)
+
+        mock_get_issues.assert_has_calls([call(x, pr, ANY) for x in pfiles],
+                                         any_order=True)
+        assert_calls(pr.create_review, call(
+            FARCY_COMMENT_START, commit_id='dummy', event='COMMENT',
+            comments=[{'body': '{0}\n* {1} Failure'.format(
+                FARCY_COMMENT_START, x.filename), 'path': x.filename,
+                'position': 16} for x in pfiles]))
+        assert_calls(pr.create_review_comment)
+        assert_status(farcy, failures=8)
+
     def test_handle_pr__pr_closed(self):
-        pr = MagicMock(number=180, state='closed')
+        pr = mockpr(number=180, state='closed')
         farcy = self._farcy_instance()
         with patch.object(self.logger, 'debug') as mock_debug:
             farcy.handle_pr(pr)
@@ -188,6 +360,35 @@ class FarcyHandlePrTest(FarcyBaseTest):
                 'Skipping PR#180: invalid state (closed)')
         pr.refresh.assert_called_with()
 
+    def test_handle_pr__refreshed_pr_closed(self):
+        pr = MagicMock(number=180, state='open')
+        pr.refresh.return_value = mockpr(number=180, state='closed')
+        farcy = self._farcy_instance()
+        with patch.object(self.logger, 'debug') as mock_debug:
+            farcy.handle_pr(pr)
+            mock_debug.assert_called_with(
+                'Skipping PR#180: invalid state (closed)')
+        self.assertFalse(farcy.repo.create_status.called)
+
+    def test_handle_pr__refreshed(self):
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        farcy = self._farcy_instance()
+        farcy.handle_pr(pr, refreshed=True)
+        self.assertFalse(pr.refresh.called)
+        assert_status(farcy)
+
+    def test_handle_pr__sha_already_handled(self):
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        farcy = self._farcy_instance()
+        farcy.handle_pr(pr)
+        assert_status(farcy)
+        with patch.object(self.logger, 'debug') as mock_debug:
+            farcy.handle_pr(pr)
+            mock_debug.assert_called_with(
+                'Skipping PR#%s: %s was already handled', 180, 'dummy')
+        self.assertEqual(1, pr.files.call_count)
+        assert_status(farcy)
+
     @patch('farcy.Farcy.get_issues')
     @patch('farcy.added_lines')
     def test_handle_pr__single_failure(self, mock_added_lines,
@@ -195,8 +396,7 @@ class FarcyHandlePrTest(FarcyBaseTest):
         mock_added_lines.return_value = {16: 16}
         mock_get_issues.return_value = {16: ['Dummy Failure']}
 
-        pr = MagicMock(number=180, state='open', user=Struct(login='Dummy'))
-        pr.commits.return_value = [Struct(sha='dummy')]
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
         pfile = mockpfile(filename='DummyFile', patch='', status='added')
         pr.files.return_value = [pfile]
 
@@ -208,10 +408,12 @@ class FarcyHandlePrTest(FarcyBaseTest):
                          call('PR#180 STATUS: found 1 issue'))
 
         mock_added_lines.assert_called_with('')
-        mock_get_issues.assert_called_once_with(pfile, pr)
-        assert_calls(pr.create_review_comment, call(
-            '{0}\n* Dummy Failure'.format(FARCY_COMMENT_START),
-            'dummy', 'DummyFile', 16))
+        mock_get_issues.assert_called_once_with(pfile, pr, ANY)
+        assert_calls(pr.create_review, call(
+            FARCY_COMMENT_START, commit_id='dummy', event='COMMENT',
+            comments=[{'body': '{0}\n* Dummy Failure'.format(
+                FARCY_COMMENT_START), 'path': 'DummyFile', 'position': 16}]))
+        assert_calls(pr.create_review_comment)
         assert_status(farcy, failures=1)
 
     @patch('farcy.Farcy.get_issues')
@@ -221,9 +423,9 @@ class FarcyHandlePrTest(FarcyBaseTest):
         mock_added_lines.return_value = {16: 16}
         mock_get_issues.return_value = {16: ['Dummy Failure']}
 
-        pr = MagicMock(number=180, state='open', user=Struct(login='Dummy'))
-        pr.commits.return_value = [Struct(sha='dummy')]
-        pr.review_comments.return_value = [self.DUMMY_COMMENT] * 128
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        pr.review_comments.return_value = self._listing(
+            [self.DUMMY_COMMENT] * 128)
 
         pfile = mockpfile(filename='DummyFile', patch='', status='added')
         pr.files.return_value = [pfile]
@@ -236,25 +438,48 @@ class FarcyHandlePrTest(FarcyBaseTest):
                              call('Handling PR#180 by Dummy'),
                              call('PR#180 STATUS: found 1 issue'))
             assert_calls(mock_debug,
-                         call('PR#180      added_files: 1'),
-                         call('PR#180      added_lines: 1'),
-                         call('PR#180           issues: 1'),
-                         call('PR#180   skipped_issues: 1'))
+                         call('PR#%s %16s: %s', 180, 'added_files', 1),
+                         call('PR#%s %16s: %s', 180, 'added_lines', 1),
+                         call('PR#%s %16s: %s', 180, 'issues', 1),
+                         call('PR#%s %16s: %s', 180, 'skipped_issues', 1))
 
         mock_added_lines.assert_called_with('')
-        mock_get_issues.assert_called_once_with(pfile, pr)
+        mock_get_issues.assert_called_once_with(pfile, pr, ANY)
+        assert_calls(pr.create_review)
         assert_calls(pr.create_review_comment)
         assert_status(farcy, failures=1)
 
+    @patch('farcy.Farcy.get_issues')
+    @patch('farcy.added_lines')
+    def test_handle_pr__single_failure__review_rejected(self,
+                                                        mock_added_lines,
+                                                        mock_get_issues):
+        mock_added_lines.return_value = {16: 16}
+        mock_get_issues.return_value = {16: ['Dummy Failure']}
+
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        pr.create_review.side_effect = UnprocessableEntity(
+            MagicMock(status_code=422))
+        pfile = mockpfile(filename='DummyFile', patch='', status='added')
+        pr.files.return_value = [pfile]
+
+        farcy = self._farcy_instance()
+        farcy.handle_pr(pr)
+
+        self.assertTrue(pr.create_review.called)
+        assert_calls(pr.create_review_comment, call(
+            '{0}\n* Dummy Failure'.format(FARCY_COMMENT_START),
+            'dummy', 'DummyFile', 16))
+        assert_status(farcy, failures=1)
+
     @patch('farcy.Farcy.get_issues')
     @patch('farcy.added_lines')
     def test_handle_pr__success(self, mock_added_lines, mock_get_issues):
         mock_added_lines.return_value = {16: 16}
         mock_get_issues.return_value = {3: ['Failure on non-modified line.']}
 
-        pr = MagicMock(number=180, state='open', user=Struct(login='Dummy'))
-        pr.commits.return_value = [Struct(sha='dummy')]
-        pfile = mockpfile(patch='', status='added')
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        pfile = mockpfile(filename='DummyFile', patch='', status='added')
         pr.files.return_value = [pfile]
 
         farcy = self._farcy_instance()
@@ -265,13 +490,13 @@ class FarcyHandlePrTest(FarcyBaseTest):
                          call('PR#180 STATUS: approves! Dummy Approval!'))
 
         mock_added_lines.assert_called_with('')
-        mock_get_issues.assert_called_once_with(pfile, pr)
+        mock_get_issues.assert_called_once_with(pfile, pr, ANY)
+        assert_calls(pr.create_review)
         assert_calls(pr.create_review_comment)
         assert_status(farcy)
 
     def test_handle_pr__success_without_any_changed_files(self):
-        pr = MagicMock(number=180, state='open', user=Struct(login='Dummy'))
-        pr.commits.return_value = [Struct(sha='dummy')]
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
         pr.files.return_value = [mockpfile()]
         farcy = self._farcy_instance()
         with patch.object(self.logger, 'info') as mock_info:
@@ -282,8 +507,7 @@ class FarcyHandlePrTest(FarcyBaseTest):
         assert_status(farcy)
 
     def test_handle_pr__success_without_files(self):
-        pr = MagicMock(number=180, state='open', user=Struct(login='Dummy'))
-        pr.commits.return_value = [Struct(sha='dummy')]
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
         farcy = self._farcy_instance()
         with patch.object(self.logger, 'info') as mock_info:
             farcy.handle_pr(pr)
@@ -292,6 +516,13 @@ class FarcyHandlePrTest(FarcyBaseTest):
                          call('PR#180 STATUS: approves! Dummy Approval!'))
         assert_status(farcy)
 
+    def test_handle_pr__uses_head_sha(self):
+        pr = mockpr(number=180, state='open', user=Struct(login='Dummy'))
+        farcy = self._farcy_instance()
+        farcy.handle_pr(pr)
+        self.assertFalse(pr.commits.called)
+        assert_status(farcy)
+
     def test_handle_pr__user_blacklisted(self):
         pr = Struct(number=180, user=Struct(login='Dummy'))
         farcy = self._farcy_instance()
@@ -310,12 +541,116 @@ class FarcyHandlePrTest(FarcyBaseTest):
             mock_debug.assert_called_with(
                 'Skipping PR#180: Dummy is not allowed')
 
+    def test_review_comments__cached(self):
+        other = Struct(body='Looks good', path='DummyFile', position=1)
+        pr = mockpr(number=180)
+        pr.review_comments.return_value = self._listing(
+            [self.DUMMY_COMMENT, other])
+        farcy = self._farcy_instance()
+        self.assertEqual([self.DUMMY_COMMENT], farcy._review_comments(pr))
+        pr.review_comments.assert_called_with(etag=None)
+
+        pr.review_comments.return_value = self._listing([], status=304)
+        self.assertEqual([self.DUMMY_COMMENT], farcy._review_comments(pr))
+        pr.review_comments.assert_called_with(etag='DUMMY_ETAG')
+
+    def test_review_comments__multiple_pages_not_cached(self):
+        pr = mockpr(number=180)
+        pr.review_comments.return_value = self._listing(
+            [self.DUMMY_COMMENT], links={'prev': {'url': 'DUMMY_URL'}})
+        farcy = self._farcy_instance()
+        self.assertEqual([self.DUMMY_COMMENT], farcy._review_comments(pr))
+        self.assertEqual({}, farcy._pr_comments)
+
+
+class FarcyCacheTest(FarcyBaseTest):
+    def setUp(self):
+        super(FarcyCacheTest, self).setUp()
+        self.cache_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.cache_dir)
+
+    def _farcy_instance(self):
+        farcy = super(FarcyCacheTest, self)._farcy_instance()
+        farcy.CACHE_DIR = self.cache_dir
+        return farcy
+
+    def _listing(self, prs, status=200, links=None):
+        return Struct(prs, etag='DUMMY_ETAG', last_status=status,
+                      last_response=Struct(links=links or {}))
+
+    def test_load_open_prs__cache_listing(self):
+        farcy = self._farcy_instance()
+        pr = Struct(as_dict=lambda: {'number': 1337}, head=Struct(ref='a'))
+        farcy.repo.pull_requests.return_value = self._listing([pr])
+        self.assertEqual({'a': pr}, farcy._load_open_prs())
+        farcy.repo.pull_requests.assert_called_with(state='open', etag=None)
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.cache_dir, 'dummy_dummy_pull_requests.json')))
+
+        farcy.repo.pull_requests.return_value = self._listing([], status=304)
+        with patch('github3.pulls.ShortPullRequest') as mock_short_pr:
+            mock_short_pr.return_value = pr
+            self.assertEqual({'a': pr}, farcy._load_open_prs())
+            mock_short_pr.assert_called_once_with({'number': 1337}, farcy.repo)
+        farcy.repo.pull_requests.assert_called_with(state='open',
+                                                    etag='DUMMY_ETAG')
+
+    def test_load_open_prs__multiple_pages_not_cached(self):
+        farcy = self._farcy_instance()
+        pr = Struct(as_dict=lambda: {'number': 1337}, head=Struct(ref='a'))
+        farcy.repo.pull_requests.return_value = self._listing(
+            [pr], links={'prev': {'url': 'DUMMY_URL'}})
+        self.assertEqual({'a': pr}, farcy._load_open_prs())
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_save_state__resume_after_restart(self):
+        farcy = self._farcy_instance()
+        farcy._save_state(1337)
+        with patch.object(Farcy, 'CACHE_DIR', self.cache_dir):
+            with patch('farcy.Farcy._load_open_prs'):
+                farcy = super(FarcyCacheTest, self)._farcy_instance()
+        self.assertEqual(1337, farcy.last_event_id)
+        self.assertEqual(None, farcy.start_time)
+
+    @patch('time.sleep')
+    def test_save_state__after_each_event_is_handled(self, mock_sleep):
+        farcy = self._farcy_instance()
+        events = [Struct(actor=Struct(login=None), type='PushEvent',
+                         created_at=datetime.now(UTC()), id=str(x))
+                  for x in (3, 2, 1)]
+        farcy.repo.events.return_value = Struct(
+            events, etag='DUMMY_ETAG', last_status=200,
+            last_response=Struct(headers={'X-Poll-Interval': 60}))
+        path = os.path.join(self.cache_dir, 'dummy_dummy_state.json')
+
+        event_itr = farcy.events()
+        self.assertEqual('1', next(event_itr).id)
+        self.assertFalse(os.path.exists(path))  # Not handled yet.
+        self.assertEqual('2', next(event_itr).id)
+        self.assertEqual({'last_event_id': 1}, load_json(path))
+        self.assertEqual('3', next(event_itr).id)
+        self.assertEqual({'last_event_id': 2}, load_json(path))
+
+    def test_save_state__start_event_takes_precedence(self):
+        farcy = self._farcy_instance()
+        farcy._save_state(1337)
+        config = Config(None)
+        config.start_event = 10
+        with patch.object(Farcy, 'CACHE_DIR', self.cache_dir):
+            with patch('farcy.Farcy._load_open_prs'):
+                farcy = super(FarcyCacheTest, self)._farcy_instance(
+                    config=config)
+        self.assertEqual(9, farcy.last_event_id)
+
 
 class FarcyEventCallbackTest(FarcyBaseTest):
     @patch('farcy.Farcy.handle_pr')
     def test_PullRequestEvent__closed_existing(self, mock_handle_pr):
         instance = self._farcy_instance()
         instance.open_prs = {'DUMMY_BRANCH': None}
+        instance._pr_last_sha = {1337: 'DUMMY_SHA', 1338: 'DUMMY_SHA'}
 
         pull_request = Struct(head={'ref': 'DUMMY_BRANCH'}, number=1337)
         event = Struct(payload={'action': 'closed',
@@ -323,6 +658,7 @@ class FarcyEventCallbackTest(FarcyBaseTest):
 
         instance.PullRequestEvent(event)
         self.assertEqual({}, instance.open_prs)
+        self.assertEqual({1338: 'DUMMY_SHA'}, instance._pr_last_sha)
         self.assertFalse(mock_handle_pr.called)
 
     @patch('farcy.Farcy.handle_pr')
@@ -346,12 +682,32 @@ class FarcyEventCallbackTest(FarcyBaseTest):
         self.assertEqual({}, instance.open_prs)
 
         pull_request = Struct(head={'ref': 'DUMMY_BRANCH'}, number=1337)
+        instance.repo.pull_request.return_value = pull_request
         event = Struct(payload={'action': 'opened',
-                                'pull_request': pull_request})
+                                'pull_request': Struct(
+                                    head={'ref': 'DUMMY_BRANCH'},
+                                    number=1337)})
 
         instance.PullRequestEvent(event)
+        instance.repo.pull_request.assert_called_once_with(1337)
         self.assertEqual({'DUMMY_BRANCH': pull_request}, instance.open_prs)
-        self.assertTrue(mock_handle_pr.called)
+        mock_handle_pr.assert_called_once_with(pull_request, refreshed=True)
+
+    def test_PullRequestEvent__opened_fetches_once(self):
+        instance = self._farcy_instance()
+        pull_request = mockpr(head=Struct(ref='DUMMY_BRANCH', sha='dummy'),
+                              number=1337, state='open',
+                              user=Struct(login='Dummy'))
+        instance.repo.pull_request.return_value = pull_request
+        event = Struct(payload={'action': 'opened',
+                                'pull_request': Struct(
+                                    head={'ref': 'DUMMY_BRANCH'},
+                                    number=1337)})
+
+        instance.PullRequestEvent(event)
+        instance.repo.pull_request.assert_called_once_with(1337)
+        self.assertFalse(pull_request.refresh.called)
+        assert_status(instance)
 
     @patch('farcy.Farcy.handle_pr')
     def test_PullRequestEvent__reopened(self, mock_handle_pr):
@@ -359,13 +715,28 @@ class FarcyEventCallbackTest(FarcyBaseTest):
         self.assertEqual({}, instance.open_prs)
 
         pull_request = Struct(head={'ref': 'DUMMY_BRANCH'}, number=1337)
+        instance.repo.pull_request.return_value = pull_request
         event = Struct(payload={'action': 'reopened',
-                                'pull_request': pull_request})
+                                'pull_request': Struct(
+                                    head={'ref': 'DUMMY_BRANCH'},
+                                    number=1337)})
 
         instance.PullRequestEvent(event)
+        instance.repo.pull_request.assert_called_once_with(1337)
         self.assertEqual({'DUMMY_BRANCH': pull_request}, instance.open_prs)
         self.assertFalse(mock_handle_pr.called)
 
+    @patch('farcy.Farcy.handle_pr')
+    def test_PullRequestEvent__opened_not_found(self, mock_handle_pr):
+        instance = self._farcy_instance()
+        instance.repo.pull_request.return_value = None
+        event = Struct(payload={'action': 'opened', 'pull_request': Struct(
+            head={'ref': 'DUMMY_BRANCH'}, number=1337)})
+
+        instance.PullRequestEvent(event)
+        self.assertEqual({}, instance.open_prs)
+        self.assertFalse(mock_handle_pr.called)
+
     @patch('farcy.Farcy.handle_pr')
     def test_PushEvent__pr_does_not_exist(self, mock_handle_pr):
         event = Struct(payload={'ref': 'refs/heads/DUMMY_BRANCH'})
@@ -444,7 +815,7 @@ class FarcyEventTest(FarcyBaseTest):
         event = Struct(actor=Struct(login=None), type='PushEvent',
                        created_at=datetime.now(UTC()), id=0xDEADBEEF)
         farcy.repo.events.return_value = Struct(
-            [event], etag='DUMMY_ETAG',
+            [event], etag='DUMMY_ETAG', last_status=200,
             last_response=Struct(headers={'X-Poll-Interval': 100}))
 
         event_itr = farcy.events()
@@ -452,6 +823,39 @@ class FarcyEventTest(FarcyBaseTest):
         farcy.running = False
         self.assertRaises(StopIteration, next, event_itr)
 
+    @patch('time.sleep')
+    def test_events__idle_backoff(self, mock_sleep):
+        farcy = self._farcy_instance()
+        event = Struct(actor=Struct(login=None), type='PushEvent',
+                       created_at=datetime.now(UTC()), id=0xDEADBEEF)
+        response = Struct(headers={'X-Poll-Interval': 60})
+        farcy.repo.events.side_effect = (
+            [Struct(etag='DUMMY_ETAG', last_status=304,
+                    last_response=response)] * 6 +
+            [Struct([event], etag='DUMMY_ETAG', last_status=200,
+                    last_response=response)])
+
+        self.assertEqual(event, next(farcy.events()))
+        self.assertEqual([call(120), call(240), call(480), call(900),
+                          call(900), call(900)], mock_sleep.call_args_list)
+
+    @patch('time.sleep')
+    def test_events__not_modified_keeps_etag(self, mock_sleep):
+        farcy = self._farcy_instance()
+        event = Struct(actor=Struct(login=None), type='PushEvent',
+                       created_at=datetime.now(UTC()), id=0xDEADBEEF)
+        response = Struct(headers={'X-Poll-Interval': 60})
+        farcy.repo.events.side_effect = (
+            Struct(etag='DUMMY_ETAG', last_status=200, last_response=response),
+            Struct(etag=None, last_status=304, last_response=response),
+            Struct([event], etag='DUMMY_ETAG', last_status=200,
+                   last_response=response))
+
+        self.assertEqual(event, next(farcy.events()))
+        self.assertEqual([call(etag=None), call(etag='DUMMY_ETAG'),
+                          call(etag='DUMMY_ETAG')],
+                         farcy.repo.events.call_args_list)
+
     @patch('farcy.Farcy._event_loop')
     @patch('time.sleep')
     def test_events__network_exception(self, mock_sleep, mock_event_loop):
@@ -480,7 +884,8 @@ class FarcyEventTest(FarcyBaseTest):
 
         event = Struct(actor=Struct(login=None), type='PushEvent',
                        created_at=datetime.now(UTC()), id=0xDEADBEEF)
-        farcy.repo.events.return_value = Struct([event], etag='DUMMY_ETAG')
+        farcy.repo.events.return_value = Struct(
+            [event], etag='DUMMY_ETAG', last_status=200)
 
         self.assertEqual(event, next(farcy.events()))
         self.assertEqual(0xDEADBEEF, farcy.last_event_id)
@@ -501,6 +906,16 @@ class FarcyEventTest(FarcyBaseTest):
         assert_calls(mock_callback, call(event1), call(event2))
         mock_callback.assert_called_with(event2)
 
+    @patch('farcy.Farcy.events')
+    @patch('farcy.Farcy.PushEvent')
+    def test_run__ignore_unknown_event_type(self, mock_callback, mock_events):
+        event1 = Struct(type='IssuesEvent', id=1)
+        event2 = Struct(type='PushEvent', id=2)
+        mock_events.return_value = [event1, event2]
+
+        self._farcy_instance().run()
+        assert_calls(mock_callback, call(event2))
+
     @patch('farcy.Farcy.handle_pr')
     def test_run__single_pull_request(self, mock_handle_pr):
         farcy = self._farcy_instance()
@@ -518,8 +933,65 @@ class FarcyEventTest(FarcyBaseTest):
         assert_calls(mock_handle_pr, call(180, force=True),
                      call(360, force=True), call(720, force=True))
 
+    @patch('farcy.Farcy.webhook_events')
+    @patch('farcy.Farcy.events')
+    @patch('farcy.Farcy.PushEvent')
+    def test_run__webhook(self, mock_callback, mock_events,
+                          mock_webhook_events):
+        event = Struct(type='PushEvent')
+        mock_webhook_events.return_value = [event]
+        farcy = self._farcy_instance()
+        farcy.config.webhook_port = 8080
+        farcy.run()
+        assert_calls(mock_callback, call(event))
+        self.assertFalse(mock_events.called)
+
+    @patch('farcy.WebhookServer')
+    def test_webhook_events(self, mock_server):
+        farcy = self._farcy_instance()
+        farcy.config.webhook_port = 8080
+        farcy.config.webhook_secret = 'secret'
+        sender = {'avatar_url': None, 'id': 1, 'login': 'Dummy', 'url': None}
+
+        def side_effect(port, secret, callback):
+            self.assertEqual(8080, port)
+            self.assertEqual('secret', secret)
+            callback('ping', 'DELIVERY_1', {})
+            callback('push', 'DELIVERY_2', {
+                'ref': 'refs/heads/a', 'repository': {'full_name': 'a/b'},
+                'sender': sender})
+            callback('push', 'DELIVERY_3', {
+                'ref': 'refs/heads/b', 'repository': {
+                    'full_name': 'Dummy/Dummy'}, 'sender': sender})
+            return mock_server.return_value
+        mock_server.side_effect = side_effect
+
+        event_itr = farcy.webhook_events()
+        event = next(event_itr)
+        self.assertEqual('PushEvent', event.type)
+        self.assertEqual('DELIVERY_3', event.id)
+        self.assertEqual('Dummy', event.actor.login)
+        self.assertEqual('refs/heads/b', event.payload['ref'])
+
+        farcy.running = False
+        self.assertRaises(StopIteration, next, event_itr)
+        self.assertTrue(mock_server.return_value.shutdown.called)
+
+    @patch('farcy.WebhookServer')
+    def test_webhook_events__requires_secret(self, mock_server):
+        farcy = self._farcy_instance()
+        farcy.config.webhook_port = 8080
+        farcy.config.webhook_secret = None
+        self.assertRaises(FarcyException, next, farcy.webhook_events())
+        self.assertFalse(mock_server.called)
+
 
 class MainTest(unittest.TestCase):
+    def test_import__defers_github3(self):
+        # Keeps `farcy --help` fast as importing github3 is slow.
+        code = 'import farcy, sys; sys.exit("github3" in sys.modules)'
+        self.assertEqual(0, subprocess.call([sys.executable, '-c', code]))
+
     @patch('farcy.Farcy')
     @patch('farcy.Config')
     def test_main__farcy_exception_in_run(self, mock_config, mock_farcy):
@@ -583,3 +1055,12 @@ class NoHandlerDebugFactory(unittest.TestCase):
         assert_calls(self.farcy.log.debug,
                      call('No handlers for extension .js'),
                      call('No handlers for extension .css'))
+
+    @patch('farcy.default_timer')
+    def test_no_handler_factory__output_once_per_duration(self, mock_timer):
+        func = no_handler_debug_factory(10)
+        for now in (11, 15, 20, 22):
+            mock_timer.return_value = now
+            func(self.farcy, '.js')
+        calls = [call('No handlers for extension .js')] * 2
+        assert_calls(self.farcy.log.debug, *calls)
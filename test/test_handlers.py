@@ -136,6 +136,35 @@ class Flake8Test(FarcyTest):
         self.assertEqual({3: ['1: E302 expected 2 blank lines, found 1']},
                          errors)
 
+    def test_failure_without_issues(self):
+        """A failed run must not be mistaken for a clean file."""
+        linter = farcy.handlers.Flake8()
+        linter._execute = lambda *args, **kwargs: (1, 'Traceback\n')
+        with self.assertRaises(HandlerException):
+            linter.process(self.path('no_issue.py'))
+
+    def test_fingerprint(self):
+        """The fingerprint depends on the version and config file."""
+        linter = farcy.handlers.Flake8()
+        linter.config_file_path = None
+        fingerprint = linter.fingerprint
+        self.assertEqual('Flake8:{0}:None'.format(linter.version),
+                         fingerprint)
+        linter.config_file_path = os.path.join(
+            os.path.dirname(__file__), 'configs', 'handler_eslint.conf')
+        with_config = linter.fingerprint
+        self.assertNotEqual(fingerprint, with_config)
+        linter.version = 'other'
+        self.assertNotEqual(with_config, linter.fingerprint)
+
+    def test_single_error__stdin(self):
+        """A single error should be returned when reading from stdin."""
+        with open(self.path('single_issue.py'), 'rb') as fp:
+            contents = fp.read()
+        errors = self.process('does_not_exist.py', contents)
+        self.assertEqual({3: ['1: E302 expected 2 blank lines, found 1']},
+                         errors)
+
 
 class Pep257Test(FarcyTest):
 
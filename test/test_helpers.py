@@ -6,6 +6,9 @@ from farcy import helpers
 from github3 import GitHub, GitHubError
 from io import IOBase
 from mock import MagicMock, patch
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
 import unittest
 import farcy.exceptions as exceptions
 
@@ -126,6 +129,30 @@ class GetSessionTest(unittest.TestCase):
         self.assertRaises(TypeError, helpers.get_session)
 
 
+class JsonFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'sub', 'state.json')
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_load_json__invalid_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as fd:
+            fd.write('{')
+        self.assertEqual({}, helpers.load_json(self.path))
+
+    def test_load_json__missing_file(self):
+        self.assertEqual({}, helpers.load_json(self.path))
+
+    def test_save_json(self):
+        helpers.save_json(self.path, {'etag': 'DUMMY'})
+        self.assertEqual({'etag': 'DUMMY'}, helpers.load_json(self.path))
+        self.assertEqual(['state.json'],
+                         os.listdir(os.path.dirname(self.path)))
+
+
 class PatchFunctionTest(unittest.TestCase):
     def test_added_lines(self):
         self.assertEqual({}, helpers.added_lines('@@+15'))
@@ -137,6 +164,13 @@ class PatchFunctionTest(unittest.TestCase):
         self.assertEqual({16: 3}, helpers.added_lines('@@+15\n-\n \n+wah'))
         self.assertEqual({1: 1, 15: 3},
                          helpers.added_lines('@@+1\n+wah\n@@+15\n+foo'))
+        self.assertEqual({3: 1, 5: 3}, helpers.added_lines(
+            '@@ -1,2 +3,4 @@ def a(b=1 + 2):\n+c\n \n+d'))
+        self.assertEqual({3: 1}, helpers.added_lines('@@ -1 +3 @@\n+c'))
+
+    def test_added_lines__memoized(self):
+        patch = '@@+1\n+memoized'
+        self.assertIs(helpers.added_lines(patch), helpers.added_lines(patch))
 
     def test_added_lines_works_with_github_no_newline_message(self):
         patch = r"""@@ -0,0 +1,5 @@
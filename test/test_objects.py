@@ -2,7 +2,12 @@
 
 from __future__ import print_function
 from farcy import objects
-from mock import patch
+from http.client import HTTPConnection
+from mock import MagicMock, patch
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import threading
 import unittest
 import farcy.exceptions as exceptions
 from .helper import Struct
@@ -85,9 +90,9 @@ class ConfigTest(unittest.TestCase):
         config = self._config_instance(None, repo='a/b')
         repr_str = ("Config('a/b', comment_group_threshold=3, debug=False, "
                     "exclude_paths=None, exclude_users=None, "
-                    "limit_users=None, log_level='ERROR', "
+                    "limit_users=None, log_level='ERROR', max_workers=5, "
                     "pr_issue_report_limit=128, pull_requests=None, "
-                    "start_event=None)")
+                    "start_event=None, webhook_port=None)")
         self.assertEqual(repr_str, repr(config))
 
     def test_default_repo_from_config(self):
@@ -102,6 +107,31 @@ class ConfigTest(unittest.TestCase):
         with self.assertRaises(exceptions.FarcyException):
             self._config_instance(callback)
 
+    def test_path_excluded(self):
+        config = self._config_instance(None, repo='a/b')
+        self.assertFalse(config.path_excluded('vendor/a.js'))
+        config.exclude_paths = 'node_modules/*,vendor/*.js'
+        self.assertTrue(config.path_excluded('node_modules/a/b.py'))
+        self.assertTrue(config.path_excluded('vendor/a.js'))
+        self.assertFalse(config.path_excluded('vendor/a.py'))
+        self.assertFalse(config.path_excluded('src/node_modules/a.py'))
+        self.assertTrue(config.path_excluded('vendor/a.js'))
+        self.assertEqual(1, config._path_excluded.cache_info().hits)
+        config.exclude_paths = None
+        self.assertFalse(config.path_excluded('vendor/a.js'))
+
+    def test_path_excluded__string_comparisons(self):
+        config = self._config_instance(None, repo='a/b')
+        config.exclude_paths = '*.min.js,docs/*,*,?.py'
+        self.assertTrue(config.path_excluded('a.py'))
+        config.exclude_paths = '*.min.js,docs/*,[ab].py'
+        self.assertTrue(config.path_excluded('src/a.min.js'))
+        self.assertTrue(config.path_excluded('docs/a/b.py'))
+        self.assertTrue(config.path_excluded('b.py'))
+        self.assertFalse(config.path_excluded('a.js'))
+        self.assertFalse(config.path_excluded('src/docs/a.py'))
+        self.assertFalse(config.path_excluded('c.py'))
+
     def test_raise_if_invalid_log_level(self):
         config = self._config_instance(None, repo='a/b')
         with self.assertRaises(exceptions.FarcyException):
@@ -136,6 +166,7 @@ class ConfigTest(unittest.TestCase):
             'exclude_paths': {'npm_modules', 'vendor'},
             'limit_users': {'balloob', 'bboe'},
             'log_level': 'WARNING',
+            'max_workers': 8,
             'pr_issue_report_limit': 100
         }
 
@@ -291,3 +322,157 @@ class ErrorTrackerTest(unittest.TestCase):
         self.assertEqual(1, self.tracker.hidden_issue_count)
         self.assertEqual(0, self.tracker.new_issue_count)
         self.assertEqual([], list(self.tracker.errors('DummyFile')))
+
+
+class IssueCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache', 'a_b_issues')
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_get__missing(self):
+        cache = objects.IssueCache(self.path)
+        self.assertEqual(None, cache.get('.py', 'deadbeef'))
+
+    def test_get__from_memory(self):
+        cache = objects.IssueCache(self.path)
+        cache.set('.py', 'deadbeef', {1: ['Dummy Failure']})
+        with patch('farcy.objects.load_json') as mock_load_json:
+            self.assertEqual({1: ['Dummy Failure']},
+                             cache.get('.py', 'deadbeef'))
+            self.assertFalse(mock_load_json.called)
+
+    def test_get__without_path(self):
+        cache = objects.IssueCache()
+        self.assertEqual(None, cache.get('.py', 'deadbeef'))
+        cache.set('.py', 'deadbeef', {1: ['Dummy Failure']})
+        self.assertEqual({1: ['Dummy Failure']}, cache.get('.py', 'deadbeef'))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_memory__least_recently_used_evicted(self):
+        cache = objects.IssueCache(self.path)
+        cache.MEMORY_SIZE = 2
+        cache.set('.py', 'a', {})
+        cache.set('.py', 'b', {})
+        cache.get('.py', 'a')
+        cache.set('.py', 'c', {})
+        self.assertEqual([cache._key('.py', 'a'), cache._key('.py', 'c')],
+                         list(cache._memory))
+        self.assertEqual({}, cache.get('.py', 'b'))  # Still on disk.
+
+    def test_max_size__evicts_least_recently_written(self):
+        cache = objects.IssueCache(self.path)
+        cache.MAX_SIZE = 4
+        cache.MEMORY_SIZE = 0
+        for mtime, sha in enumerate('abcd'):
+            cache.set('.py', sha, {})
+            os.utime(cache._entry_path(cache._key('.py', sha)),
+                     (mtime, mtime))
+        self.assertEqual(4, len(os.listdir(self.path)))
+        cache.set('.py', 'e', {})
+        self.assertEqual(2, len(os.listdir(self.path)))
+        self.assertEqual(None, cache.get('.py', 'a'))
+        self.assertEqual(None, cache.get('.py', 'c'))
+        self.assertEqual({}, cache.get('.py', 'd'))
+        self.assertEqual({}, cache.get('.py', 'e'))
+
+    def test_not_created_until_set(self):
+        cache = objects.IssueCache(self.path)
+        cache.get('.py', 'deadbeef')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_set__one_file_per_entry(self):
+        cache = objects.IssueCache(self.path)
+        cache.set('.py', 'a', {})
+        cache.set('.py', 'b', {})
+        cache.set('.py', 'b', {1: ['Dummy Failure']})  # Replaces b.
+        self.assertEqual(2, len(os.listdir(self.path)))
+
+    def test_set__persists_across_instances(self):
+        cache = objects.IssueCache(self.path)
+        cache.set('.py', 'deadbeef', {1: ['Dummy Failure']})
+
+        cache = objects.IssueCache(self.path)
+        self.assertEqual({1: ['Dummy Failure']}, cache.get('.py', 'deadbeef'))
+        self.assertEqual(None, cache.get('.rb', 'deadbeef'))
+
+
+class WebhookServerTest(unittest.TestCase):
+    BODY = b'{"repository": {"full_name": "a/b"}, "sender": {}}'
+    SIGNATURE = ('sha256=124537ddfe396d15063de3e2c00f2521'
+                 '5574ec50a92d07771b88cec0952807ce')
+
+    def setUp(self):
+        self.callback = MagicMock()
+        self.server = objects.WebhookServer(0, 'secret', self.callback,
+                                            address='127.0.0.1')
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _post(self, path='/webhook', body=BODY, signature=SIGNATURE):
+        connection = HTTPConnection(*self.server.server_address)
+        connection.request('POST', path, body=body, headers={
+            'X-GitHub-Delivery': 'DUMMY_ID', 'X-GitHub-Event': 'ping',
+            'X-Hub-Signature-256': signature})
+        status = connection.getresponse().status
+        connection.close()
+        return status
+
+    def test_delivery(self):
+        self.assertEqual(204, self._post())
+        self.callback.assert_called_once_with(
+            'ping', 'DUMMY_ID', {'repository': {'full_name': 'a/b'},
+                                 'sender': {}})
+
+    def test_delivery__invalid_signature(self):
+        self.assertEqual(403, self._post(signature='sha256=deadbeef'))
+        self.assertFalse(self.callback.called)
+
+    def test_delivery__missing_keys(self):
+        self.assertEqual(400, self._post(
+            body=b'{"zen": "Keep it logically awesome."}',
+            signature=('sha256=bb5172ebb2c3210bbfd74dde6064c49b'
+                       '6b33653e19c6cc146f7d1f08fde071d4')))
+        self.assertFalse(self.callback.called)
+
+    def test_delivery__unknown_path(self):
+        self.assertEqual(404, self._post(path='/'))
+        self.assertFalse(self.callback.called)
+
+    def test_init__without_secret(self):
+        for secret in (None, ''):
+            with self.assertRaises(exceptions.FarcyException):
+                objects.WebhookServer(0, secret, self.callback,
+                                      address='127.0.0.1')
+
+
+class WorkspaceTest(unittest.TestCase):
+    def test_close(self):
+        with objects.Workspace() as workspace:
+            self.assertTrue(os.path.isdir(workspace.path))
+        self.assertFalse(os.path.exists(workspace.path))
+
+    def test_file_path(self):
+        with objects.Workspace() as workspace:
+            path = workspace.file_path('a/b/c.py')
+            self.assertEqual(os.path.join(workspace.path, 'a', 'b', 'c.py'),
+                             path)
+            self.assertTrue(os.path.isdir(os.path.dirname(path)))
+
+    def test_prepare__once_per_handler(self):
+        handler_1 = MagicMock()
+        handler_2 = MagicMock()
+        with objects.Workspace() as workspace:
+            workspace.prepare([handler_1], 'repo', 'pr')
+            workspace.prepare([handler_1, handler_2], 'repo', 'pr')
+        handler_1.prepare_directory.assert_called_once_with(
+            workspace.path, 'repo', 'pr')
+        handler_2.prepare_directory.assert_called_once_with(
+            workspace.path, 'repo', 'pr')